@@ -0,0 +1,120 @@
+import json
+import math
+from datetime import datetime
+from psycopg2.extras import execute_values
+
+# 出餐時間統計（下單 first_time → 完成 finish_time）
+# 每完成一張訂單就更新一次，不需要每次都重新掃描 finish_orders
+# 統計範圍：整間餐廳（restaurant）、每道菜（item）、下單時段（hour，0~23 點）
+# 分位數用對數分桶的小型直方圖（sketch，存成 jsonb）估算，誤差約 ±2%，只存有資料的桶
+# 清空歷史交易不會清掉統計，估計等候時間才有足夠樣本
+
+SKETCH_ACCURACY = 0.02  # 分位數相對誤差
+_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+MIN_SAMPLES = 5  # 樣本數少於這個就不拿來估計等候時間
+
+
+# 秒數對應的 sketch 桶編號
+def sketch_index(seconds):
+    return str(math.ceil(math.log(max(seconds, 1.0)) / _LOG_GAMMA))
+
+
+# 從 sketch 估算第 q 分位數（秒）
+def sketch_quantile(sketch, q):
+    total = sum(sketch.values())
+    if not total:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for index in sorted(sketch, key=int):
+        seen += sketch[index]
+        if seen > rank:
+            return 2 * _GAMMA ** int(index) / (_GAMMA + 1)  # 桶的代表值
+
+
+# 統計列轉成畫面用的 dict（秒數）
+def summarize(row):
+    sketch = json.loads(row["sketch"])
+    return {
+        "key": row["key"],
+        "count": row["count"],
+        "mean": row["total_seconds"] / row["count"] if row["count"] else None,
+        "p50": sketch_quantile(sketch, 0.5),
+        "p90": sketch_quantile(sketch, 0.9),
+    }
+
+
+# 訂單完成時更新統計（與 finish_order 同一個交易提交）
+def record_prep_time(cur, restaurant_id, first_time, finish_time, item_names):
+    # 資料庫的時間若有時區，完成時間也轉成同一個時區再相減
+    if first_time.tzinfo is not None and finish_time.tzinfo is None:
+        finish_time = finish_time.astimezone(first_time.tzinfo)
+    seconds = max((finish_time - first_time).total_seconds(), 0)
+
+    # 每個統計範圍一列，一次 upsert；依固定順序寫入，避免兩張訂單同時完成時互相等待（deadlock）
+    sketch = json.dumps({sketch_index(seconds): 1})
+    keys = sorted({("restaurant", ""), ("hour", str(first_time.hour))} | {("item", name) for name in item_names})
+    execute_values(cur, """
+        INSERT INTO prep_time_stats AS s (restaurant_id, scope, key, count, total_seconds, sketch)
+        VALUES %s
+        ON CONFLICT (restaurant_id, scope, key) DO UPDATE
+        SET count = s.count + EXCLUDED.count,
+            total_seconds = s.total_seconds + EXCLUDED.total_seconds,
+            sketch = (
+                -- 兩個 sketch 同一桶的次數相加
+                SELECT jsonb_object_agg(k, COALESCE((s.sketch ->> k)::int, 0) + COALESCE((EXCLUDED.sketch ->> k)::int, 0))
+                FROM (SELECT jsonb_object_keys(s.sketch) UNION SELECT jsonb_object_keys(EXCLUDED.sketch)) AS keys (k)
+            )
+    """, [(restaurant_id, scope, key, 1, seconds, sketch) for scope, key in keys],
+        template="(%s, %s, %s, %s, %s, %s::jsonb)")
+
+
+# 取得餐廳的出餐時間統計：{"restaurant": {...} 或 None, "items": [...], "hours": [...]}
+def get_prep_stats(cur, restaurant_id):
+    cur.execute("""
+        SELECT scope, key, count, total_seconds, sketch::text AS sketch
+        FROM prep_time_stats
+        WHERE restaurant_id = %s AND count > 0
+    """, (restaurant_id,))
+    stats = {"restaurant": None, "items": [], "hours": []}
+    for row in cur.fetchall():
+        summary = summarize(row)
+        if row["scope"] == "restaurant":
+            stats["restaurant"] = summary
+        elif row["scope"] == "item":
+            stats["items"].append(summary)
+        else:
+            stats["hours"].append(summary)
+    stats["items"].sort(key=lambda s: s["count"], reverse=True)
+    stats["hours"].sort(key=lambda s: int(s["key"]))
+    return stats
+
+
+# 從這個時段（樣本不足就用整間餐廳）的中位數估計等候時間，回傳分鐘數或 None
+def pick_estimate(rows):
+    for scope in ("hour", "restaurant"):
+        for row in rows:
+            if row["scope"] == scope and row["count"] >= MIN_SAMPLES:
+                p50 = sketch_quantile(json.loads(row["sketch"]), 0.5)
+                return max(1, math.ceil(p50 / 60))
+    return None
+
+
+# 估計目前下單的等候時間（分鐘）
+def estimate_wait(cur, restaurant_id):
+    cur.execute("""
+        SELECT scope, count, sketch::text AS sketch FROM prep_time_stats
+        WHERE restaurant_id = %s
+          AND ((scope = 'hour' AND key = %s) OR scope = 'restaurant')
+    """, (restaurant_id, str(datetime.now().hour)))
+    return pick_estimate(cur.fetchall())
+
+
+async def estimate_wait_async(conn, restaurant_id):
+    rows = await conn.fetch("""
+        SELECT scope, count, sketch::text AS sketch FROM prep_time_stats
+        WHERE restaurant_id = $1
+          AND ((scope = 'hour' AND key = $2) OR scope = 'restaurant')
+    """, restaurant_id, str(datetime.now().hour))
+    return pick_estimate(rows)
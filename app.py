@@ -7,17 +7,23 @@ from validate_email import validate_email
 import qrcode
 from menu import menu_bp
 from client_orders import client_bp
-from db import get_db
+from db import get_db, ensure_schema
 from helpers import login_required
 from psycopg2.extras import RealDictCursor
 import uuid
 from flask_mail import Mail, Message
 from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
 
 load_dotenv()  # 讀取 .env 檔案內容
 
 app = Flask(__name__)
 
+# Jinja 編譯快取：樣板編譯結果存到檔案，新啟動的 worker 不用重新編譯
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", "jinja_cache")
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(JINJA_CACHE_DIR)}
+
 # 設定郵件寄送
 app.config["MAIL_SERVER"] = os.getenv("MAIL_SERVER")
 app.config["MAIL_PORT"] = int(os.getenv("MAIL_PORT"))
@@ -35,6 +41,9 @@ def close_db(error):
     # 如果g沒有conn，就回傳None
     if conn is not None:
         conn.close()
+    read_conn = g.pop("read_conn", None)  # 唯讀副本的連線
+    if read_conn is not None:
+        read_conn.close()
 
 
 # session過濾器設定
@@ -43,6 +52,14 @@ app.config["SESSION_PERMANENT"] = False
 app.config["SESSION_TYPE"] = "filesystem"
 Session(app)
 
+# 建立新增的資料表（訂單請求鍵、菜單版本、出餐時間統計）
+# 部署時執行一次：flask --app app init-db
+@app.cli.command("init-db")
+def init_db_command():
+    ensure_schema()
+    print("資料表已建立")
+
+
 # 註冊 Blueprint
 app.register_blueprint(menu_bp)
 app.register_blueprint(client_bp)
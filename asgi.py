@@ -0,0 +1,34 @@
+import os
+from quart import Quart
+from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
+from client_orders_async import client_async_bp
+from db_async import init_pool, close_pool
+
+load_dotenv()  # 讀取 .env 檔案內容
+
+# 客戶端（掃碼點餐）的非同步服務，和 app.py 的同步後台並行執行：
+#   gunicorn app:app                 → 登入、菜單管理、訂單列表等後台頁面
+#   hypercorn asgi:app --bind :8001  → /menu/<uuid>、/order/<restaurant_id>
+# 由反向代理（例如 nginx）把這兩個路徑轉到 8001 即可
+# 資料表請先用 flask --app app init-db 建立
+app = Quart(__name__)
+app.secret_key = os.urandom(24)
+
+# Jinja 編譯快取：Quart 以 async 模式編譯樣板，編譯結果與 app.py（同步）不相容，
+# 快取的 key 又不分 async，所以必須用獨立的子資料夾，不能和 app.py 共用
+JINJA_CACHE_DIR = os.path.join(os.getenv("JINJA_CACHE_DIR", "jinja_cache"), "async")
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(JINJA_CACHE_DIR)}
+
+app.register_blueprint(client_async_bp)
+
+
+@app.before_serving
+async def startup():
+    await init_pool()
+
+
+@app.after_serving
+async def shutdown():
+    await close_pool()
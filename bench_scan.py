@@ -0,0 +1,55 @@
+import argparse
+import http.client
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# 掃碼壓力測試：比較同步（gunicorn app:app）與非同步（hypercorn asgi:app）的併發掃碼量
+# 例：
+#   gunicorn -w 1 app:app --bind :8000
+#   hypercorn -w 1 asgi:app --bind :8001
+#   python bench_scan.py http://127.0.0.1:8000/menu/<uuid> -c 50 -n 2000
+#   python bench_scan.py http://127.0.0.1:8001/menu/<uuid> -c 50 -n 2000
+
+
+# 單次請求，回傳 (耗時秒數, 是否成功)；4xx/5xx、逾時、連線失敗都算失敗，不會中斷整輪測試
+def fetch(url, timeout):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            resp.read()
+            ok = resp.status == 200
+    # URLError 包含 HTTPError；HTTPException 是 BadStatusLine、IncompleteRead 等壓力下的回應錯誤
+    except (urllib.error.URLError, http.client.HTTPException, TimeoutError, ConnectionError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="掃碼頁面併發壓力測試")
+    parser.add_argument("url", help="客戶菜單網址，例如 http://127.0.0.1:8000/menu/<uuid>")
+    parser.add_argument("-c", "--concurrency", type=int, default=50, help="同時連線數")
+    parser.add_argument("-n", "--requests", type=int, default=1000, help="總請求數")
+    parser.add_argument("-t", "--timeout", type=float, default=10, help="單次請求逾時秒數")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(fetch, [args.url] * args.requests, [args.timeout] * args.requests))
+    elapsed = time.perf_counter() - start
+
+    # 只用成功的請求計算吞吐量與延遲，失敗的另外列出
+    latencies = sorted(r[0] for r in results if r[1])
+    failed = len(results) - len(latencies)
+    print(f"請求數：{args.requests}  併發：{args.concurrency}  失敗：{failed}")
+    if not latencies:
+        print("全部失敗，請確認網址與服務是否啟動")
+        return
+    print(f"每秒成功請求：{len(latencies) / elapsed:.1f} req/s")
+    print(f"延遲 p50：{statistics.median(latencies) * 1000:.1f} ms  "
+          f"p95：{latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
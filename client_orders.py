@@ -1,13 +1,17 @@
 from flask import Blueprint, request,render_template
+import secrets
 from db import get_db
 from psycopg2.extras import RealDictCursor
+from fragment_cache import category_fragments
+from analytics import estimate_wait
+from idempotency import purge_expired_order_keys, find_order_number, claim_order_key, save_order_number
 
 client_bp = Blueprint("client_bp", __name__)  # 定義一個 Blueprint
 
 # 當客戶掃描 QR code
 @client_bp.route("/menu/<uuid>")
 def menu_page(uuid):
-    conn = get_db()
+    conn = get_db(readonly=True)
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         # 找到對應餐廳
         cur.execute("SELECT id, restaurant_name FROM restaurant WHERE uuid = %s", (uuid,))
@@ -15,28 +19,40 @@ def menu_page(uuid):
         if not restaurant:
             return "餐廳不存在", 404
         
-        # 查出這家餐廳的菜單
-        cur.execute("SELECT * FROM menu WHERE restaurant_id = %s AND available = TRUE  ORDER BY category, name", (restaurant["id"],))
-        items = cur.fetchall()
+        # 這家餐廳菜單的各分類區塊（有快取就不用查菜單）
+        category_blocks = category_fragments(
+            cur, "_order_category.html", restaurant["id"],
+            "SELECT * FROM menu WHERE restaurant_id = %s AND available = TRUE  ORDER BY category, name",
+        )
 
-    # 依分類分組
-    items_by_category = {}
-    for item in items:
-        category = item["category"] or "其他"  # 若分類是 None 或空字串，就歸為「其他」
-        if category not in items_by_category:
-            items_by_category[category] = []
-        items_by_category[category].append(item)
-    
-    return render_template("client_menu.html", restaurant=restaurant, menu_items_by_category=items_by_category)
+    # 請求鍵預設值（瀏覽器會在 pageshow 時換成自己產生的）
+    request_key = secrets.token_hex(16)
+    return render_template("client_menu.html", restaurant=restaurant, category_blocks=category_blocks,
+                           request_key=request_key)
     
 
 # 當客戶送出訂單
 @client_bp.route("/order/<int:restaurant_id>", methods=["POST"])
 def submit_order(restaurant_id):
     int_out = request.form.get("int_out")
+    request_key = request.form.get("request_key")  # 前端產生的請求鍵，重送時不變
 
     conn = get_db()
+    if request_key:
+        purge_expired_order_keys(conn)  # 在訂單交易之外清除過期請求鍵
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # 同一個請求鍵已經下過單：直接回傳原本的號碼，不重複建立訂單
+        if request_key:
+            pickup_number = find_order_number(cur, restaurant_id, request_key)
+            if pickup_number is None and not claim_order_key(cur, restaurant_id, request_key):
+                pickup_number = find_order_number(cur, restaurant_id, request_key)
+                if pickup_number is None:
+                    return "訂單處理中，請稍後再試", 409
+            if pickup_number is not None:
+                conn.rollback()
+                return render_template("order_success.html", pickup_number=pickup_number,
+                                       estimated_wait=estimate_wait(cur, restaurant_id))
+
         # 查目前號碼
         cur.execute("SELECT current_number FROM number_counter WHERE restaurant_id = %s", (restaurant_id,))
         result = cur.fetchone()
@@ -68,6 +84,11 @@ def submit_order(restaurant_id):
         if not checking:
             return  "請選擇至少一個菜品！", 404
 
+        if request_key:
+            save_order_number(cur, restaurant_id, request_key, pickup_number)
         conn.commit()
 
-    return render_template("order_success.html", pickup_number=pickup_number)
\ No newline at end of file
+        # 依過去的出餐時間估計等候時間
+        estimated_wait = estimate_wait(cur, restaurant_id)
+
+    return render_template("order_success.html", pickup_number=pickup_number, estimated_wait=estimated_wait)
\ No newline at end of file
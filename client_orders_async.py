@@ -0,0 +1,128 @@
+from quart import Blueprint, request, render_template
+import secrets
+from markupsafe import Markup
+from db_async import get_pool
+from fragment_cache import get_menu_version_async, get_fragments, set_fragments, group_by_category
+from analytics import estimate_wait_async
+from idempotency import (purge_expired_order_keys_async, find_order_number_async, claim_order_key_async,
+                         save_order_number_async)
+
+# client_orders.py 的非同步版本（掃 QR code、送出訂單）
+# 等待 PostgreSQL 時不佔用 worker，由 asgi.py 掛載
+client_async_bp = Blueprint("client_bp", __name__)
+
+
+# 當客戶掃描 QR code
+@client_async_bp.route("/menu/<uuid>")
+async def menu_page(uuid):
+    async with get_pool().acquire() as conn:
+        # 找到對應餐廳
+        restaurant = await conn.fetchrow("SELECT id, restaurant_name FROM restaurant WHERE uuid = $1", uuid)
+        if not restaurant:
+            return "餐廳不存在", 404
+
+        # 這家餐廳菜單的各分類區塊（有快取就不用查菜單）
+        category_blocks = await category_fragments_async(conn, "_order_category.html", restaurant["id"])
+
+    # 請求鍵預設值（瀏覽器會在 pageshow 時換成自己產生的）
+    request_key = secrets.token_hex(16)
+    return await render_template("client_menu.html", restaurant=restaurant, category_blocks=category_blocks,
+                                 request_key=request_key)
+
+
+# 取得各分類區塊的 HTML（fragment_cache.category_fragments 的非同步版本）
+async def category_fragments_async(conn, template, restaurant_id):
+    version = await get_menu_version_async(conn, restaurant_id)
+    fragments = get_fragments(template, restaurant_id, version)
+    if fragments is None:
+        items = await conn.fetch(
+            "SELECT * FROM menu WHERE restaurant_id = $1 AND available = TRUE  ORDER BY category, name",
+            restaurant_id,
+        )
+        fragments = []
+        for index, (category, category_items) in enumerate(group_by_category(items).items(), start=1):
+            html = await render_template(template, category=category, items=category_items, index=index,
+                                         first=index == 1)
+            fragments.append(Markup(html))
+        set_fragments(template, restaurant_id, version, fragments)
+    return fragments
+
+
+# 當客戶送出訂單
+@client_async_bp.route("/order/<int:restaurant_id>", methods=["POST"])
+async def submit_order(restaurant_id):
+    form = await request.form
+
+    async with get_pool().acquire() as conn:
+        if form.get("request_key"):
+            await purge_expired_order_keys_async(conn)  # 在訂單交易之外清除過期請求鍵
+
+        tr = conn.transaction()
+        await tr.start()
+        try:
+            pickup_number, error, created = await create_order(conn, restaurant_id, form)
+        except BaseException:
+            await tr.rollback()
+            raise
+        # 只有真的建立新訂單才提交，其餘情況一律回滾
+        if created:
+            await tr.commit()
+        else:
+            await tr.rollback()
+
+        # 依過去的出餐時間估計等候時間
+        estimated_wait = await estimate_wait_async(conn, restaurant_id) if not error else None
+
+    if error:
+        return error
+    return await render_template("order_success.html", pickup_number=pickup_number,
+                                 estimated_wait=estimated_wait)
+
+
+# 在目前交易中建立訂單，回傳 (取餐號碼, 錯誤回應, 是否新建立)
+async def create_order(conn, restaurant_id, form):
+    int_out = form.get("int_out")
+    request_key = form.get("request_key")  # 前端產生的請求鍵，重送時不變
+
+    # 同一個請求鍵已經下過單：直接回傳原本的號碼，不重複建立訂單
+    if request_key:
+        pickup_number = await find_order_number_async(conn, restaurant_id, request_key)
+        if pickup_number is None and not await claim_order_key_async(conn, restaurant_id, request_key):
+            pickup_number = await find_order_number_async(conn, restaurant_id, request_key)
+            if pickup_number is None:
+                return None, ("訂單處理中，請稍後再試", 409), False
+        if pickup_number is not None:
+            return pickup_number, None, False
+
+    # 查目前號碼
+    current_number = await conn.fetchval(
+        "SELECT current_number FROM number_counter WHERE restaurant_id = $1", restaurant_id
+    )
+    if current_number is not None:
+        pickup_number = current_number + 1
+        await conn.execute("UPDATE number_counter SET current_number = $1 WHERE restaurant_id = $2",
+                           pickup_number, restaurant_id)
+    else:
+        pickup_number = 1
+        await conn.execute("INSERT INTO number_counter (restaurant_id, current_number) VALUES ($1, $2)",
+                           restaurant_id, pickup_number)
+
+    # 查詢菜單
+    menu_items = await conn.fetch("SELECT id, name, price FROM menu WHERE restaurant_id = $1", restaurant_id)
+    rows = []
+    for m in menu_items:
+        qty = int(form.get(f"qty_{m['id']}", 0))
+        remark = form.get(f"remark_{m['id']}", "")
+        if qty > 0:
+            rows.append((restaurant_id, pickup_number, m["id"], m["name"], qty, remark, m["price"], int_out))
+    if not rows:    # 請選擇至少一個菜品
+        return None, ("請選擇至少一個菜品！", 404), False
+
+    await conn.executemany("""
+        INSERT INTO orders (restaurant_id, number, name_id, name, quantity, remark, price, int_out)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    """, rows)
+
+    if request_key:
+        await save_order_number_async(conn, restaurant_id, request_key, pickup_number)
+    return pickup_number, None, True
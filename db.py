@@ -1,6 +1,7 @@
 import psycopg2
-from flask import g
+from flask import g, session, has_request_context
 import os
+import time
 from dotenv import load_dotenv
 
 
@@ -16,9 +17,114 @@ DB_PARAMS = {
     "port": os.getenv("DB_PORT"),
 }
 
+# 唯讀副本（read replica）連線設定，沒設定 DB_READ_HOST 就全部走主庫
+# 其餘欄位沒設定時沿用主庫的值，例如本機兩個 PostgreSQL：
+#   DB_PORT=5432  DB_READ_HOST=127.0.0.1  DB_READ_PORT=5433
+DB_READ_PARAMS = {
+    "dbname": os.getenv("DB_READ_NAME", DB_PARAMS["dbname"]),
+    "user": os.getenv("DB_READ_USER", DB_PARAMS["user"]),
+    "password": os.getenv("DB_READ_PASSWORD", DB_PARAMS["password"]),
+    "host": os.getenv("DB_READ_HOST"),
+    "port": os.getenv("DB_READ_PORT", DB_PARAMS["port"]),
+    "connect_timeout": int(os.getenv("DB_READ_CONNECT_TIMEOUT", 2)),
+}
+READ_STICKY_SECONDS = float(os.getenv("DB_READ_STICKY_SECONDS", 5))  # 寫入後多久內讀主庫（讀到自己的寫入）
+READ_MAX_LAG_SECONDS = float(os.getenv("DB_READ_MAX_LAG", 5))  # 副本落後超過幾秒就改讀主庫
+READ_CHECK_INTERVAL = float(os.getenv("DB_READ_CHECK_INTERVAL", 10))  # 副本狀態檢查間隔
+
+# 副本狀態（每個 worker 各自記錄），避免每個請求都去量延遲
+_replica_state = {"ok": True, "checked_at": 0.0}
+
+
+# 主庫連線：commit 成功才算真的寫入，記下寫入時間給「讀到自己的寫入」使用
+class PrimaryConnection(psycopg2.extensions.connection):
+    def commit(self):
+        super().commit()
+        mark_write()
+
+
+# 建立應用程式需要的資料表（schema.sql）
+# 部署時執行一次：flask --app app init-db（不在 worker 啟動時執行）
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+SCHEMA_LOCK_ID = 20251026  # pg_advisory_xact_lock 的鎖編號，同時執行也只會一個一個建立
+
+
+def ensure_schema():
+    with open(SCHEMA_FILE, encoding="utf-8") as f:
+        sql = f.read()
+    conn = psycopg2.connect(**DB_PARAMS)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+            cur.execute(sql)
+        conn.commit()
+    finally:
+        conn.close()
+
 
 # 每次使用前建立連線
-def get_db():
+# readonly=True 會優先使用唯讀副本；副本不可用時自動改用主庫
+def get_db(readonly=False):
+    if readonly and replica_available():
+        if "read_conn" not in g:
+            try:
+                g.read_conn = psycopg2.connect(**DB_READ_PARAMS)
+            except psycopg2.OperationalError:
+                mark_replica_down()  # 連不上副本，這次直接改讀主庫
+        if "read_conn" in g:
+            return g.read_conn
+
     if "conn" not in g:  # g 是 Flask 全域暫存區
-        g.conn = psycopg2.connect(**DB_PARAMS)  # connect連接
+        g.conn = psycopg2.connect(**DB_PARAMS, connection_factory=PrimaryConnection)  # connect連接
     return g.conn
+
+
+# 記錄這個 session 剛寫過主庫，接下來一小段時間都讀主庫
+# 沒設定副本就不需要，避免每個請求都寫 session
+def mark_write():
+    if DB_READ_PARAMS["host"] and has_request_context():
+        session["db_last_write"] = time.time()
+
+
+# 這個請求能不能讀副本
+def replica_available():
+    if not DB_READ_PARAMS["host"]:
+        return False
+    # 讀到自己的寫入：剛寫過的 session 先讀主庫
+    if has_request_context() and time.time() - session.get("db_last_write", 0) < READ_STICKY_SECONDS:
+        return False
+    if time.time() - _replica_state["checked_at"] >= READ_CHECK_INTERVAL:
+        check_replica()
+    return _replica_state["ok"]
+
+
+# 檢查副本是否連得上、延遲是否在允許範圍內
+def check_replica():
+    _replica_state["checked_at"] = time.time()
+    try:
+        conn = psycopg2.connect(**DB_READ_PARAMS)
+    except psycopg2.OperationalError:
+        _replica_state["ok"] = False
+        return
+    try:
+        with conn.cursor() as cur:
+            # 已收到的 WAL 都重播完就是完全追上（延遲 0）；
+            # 否則才看最後重播的交易時間，主庫閒置時不會被誤判為落後
+            cur.execute("""
+                SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0
+                            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                            ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+                       END
+            """)
+            lag = cur.fetchone()[0]
+        _replica_state["ok"] = lag <= READ_MAX_LAG_SECONDS
+    except psycopg2.Error:
+        _replica_state["ok"] = False
+    finally:
+        conn.close()
+
+
+# 副本連線失敗，等下一次檢查前都改讀主庫
+def mark_replica_down():
+    _replica_state["ok"] = False
+    _replica_state["checked_at"] = time.time()
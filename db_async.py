@@ -0,0 +1,37 @@
+import os
+import asyncpg
+from db import DB_PARAMS
+
+# 非同步連線池（asyncpg），只給 asgi.py 的客戶端路由使用
+# 管理後台仍然走 db.py 的同步連線
+ASYNC_POOL_MIN = int(os.getenv("ASYNC_DB_POOL_MIN", 2))
+ASYNC_POOL_MAX = int(os.getenv("ASYNC_DB_POOL_MAX", 10))
+
+pool = None
+
+
+# 服務啟動時建立連線池
+async def init_pool():
+    global pool
+    pool = await asyncpg.create_pool(
+        database=DB_PARAMS["dbname"],
+        user=DB_PARAMS["user"],
+        password=DB_PARAMS["password"],
+        host=DB_PARAMS["host"],
+        port=int(DB_PARAMS["port"]) if DB_PARAMS["port"] else None,
+        min_size=ASYNC_POOL_MIN,
+        max_size=ASYNC_POOL_MAX,
+    )
+
+
+# 服務關閉時釋放連線池
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+
+
+# 取得連線池，用法：async with get_pool().acquire() as conn:
+def get_pool():
+    return pool
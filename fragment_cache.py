@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from flask import render_template
+from markupsafe import Markup
+
+# 菜單分類區塊的 HTML 快取（每個 worker 各自一份）
+# key 是 (區塊樣板, 餐廳id)，值是 (菜單版本, 各分類的 HTML)
+# 菜單有新增、編輯、刪除時版本 +1，舊的快取自然失效，命中時連菜單都不用查
+MAX_ENTRIES = 500  # 最多快取幾個 (樣板, 餐廳) 組合
+
+_fragments = OrderedDict()
+_lock = threading.Lock()
+
+
+# 查詢目前菜單版本
+def get_menu_version(cur, restaurant_id):
+    cur.execute("SELECT version FROM menu_versions WHERE restaurant_id = %s", (restaurant_id,))
+    row = cur.fetchone()
+    return row["version"] if row else 0
+
+
+async def get_menu_version_async(conn, restaurant_id):
+    version = await conn.fetchval("SELECT version FROM menu_versions WHERE restaurant_id = $1", restaurant_id)
+    return version or 0
+
+
+# 菜單有異動時版本 +1（與異動同一個交易提交）
+def bump_menu_version(cur, restaurant_id):
+    cur.execute("""
+        INSERT INTO menu_versions (restaurant_id, version) VALUES (%s, 1)
+        ON CONFLICT (restaurant_id) DO UPDATE SET version = menu_versions.version + 1
+    """, (restaurant_id,))
+
+
+# 取出快取的分類區塊；版本不符就當作沒有
+def get_fragments(template, restaurant_id, version):
+    with _lock:
+        entry = _fragments.get((template, restaurant_id))
+        if entry is None or entry[0] != version:
+            return None
+        _fragments.move_to_end((template, restaurant_id))
+        return entry[1]
+
+
+# 存入分類區塊，超過上限就丟掉最久沒用的
+def set_fragments(template, restaurant_id, version, fragments):
+    with _lock:
+        _fragments[(template, restaurant_id)] = (version, fragments)
+        _fragments.move_to_end((template, restaurant_id))
+        while len(_fragments) > MAX_ENTRIES:
+            _fragments.popitem(last=False)
+
+
+# 依分類分組：{分類名稱: [菜單們]}
+def group_by_category(items):
+    items_by_category = {}
+    for item in items:
+        category = item["category"] or "其他"  # 若分類是 None 或空字串，就歸為「其他」
+        if category not in items_by_category:
+            items_by_category[category] = []
+        items_by_category[category].append(item)
+    return items_by_category
+
+
+# 取得各分類區塊的 HTML：有快取直接用，沒有才查菜單（sql 只帶 restaurant_id 一個參數）並渲染
+def category_fragments(cur, template, restaurant_id, sql):
+    version = get_menu_version(cur, restaurant_id)
+    fragments = get_fragments(template, restaurant_id, version)
+    if fragments is None:
+        cur.execute(sql, (restaurant_id,))
+        items_by_category = group_by_category(cur.fetchall())
+        fragments = [
+            Markup(render_template(template, category=category, items=items, index=index, first=index == 1))
+            for index, (category, items) in enumerate(items_by_category.items(), start=1)
+        ]
+        set_fragments(template, restaurant_id, version, fragments)
+    return fragments
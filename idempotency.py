@@ -0,0 +1,97 @@
+import random
+from datetime import timedelta
+
+# 訂單請求鍵（防止手機重送、連點造成重複下單）
+# 表單帶著前端產生的 request_key，同一個鍵在有效期限內只會建立一張訂單
+ORDER_KEY_TTL = timedelta(hours=24)  # 請求鍵保留時間
+PURGE_PROBABILITY = 0.01  # 約每 100 個請求清一次過期的請求鍵
+PURGE_BATCH = 500  # 每次最多清幾筆
+
+# 清除過期請求鍵：略過別人正在鎖的列（SKIP LOCKED），不會互相等待或 deadlock
+PURGE_SQL = """
+    DELETE FROM order_requests
+    WHERE (restaurant_id, request_key) IN (
+        SELECT restaurant_id, request_key FROM order_requests
+        WHERE created_at <= NOW() - {ttl}
+        LIMIT {batch}
+        FOR UPDATE SKIP LOCKED
+    )
+"""
+
+
+# 偶爾清掉過期的請求鍵；要在訂單交易開始前呼叫，自己提交
+def purge_expired_order_keys(conn):
+    if random.random() >= PURGE_PROBABILITY:
+        return
+    with conn.cursor() as cur:
+        cur.execute(PURGE_SQL.format(ttl="%s", batch=PURGE_BATCH), (ORDER_KEY_TTL,))
+    conn.commit()
+
+
+# 查詢此請求鍵是否已經下過單，有的話回傳原本的取餐號碼
+def find_order_number(cur, restaurant_id, request_key):
+    cur.execute("""
+        SELECT pickup_number FROM order_requests
+        WHERE restaurant_id = %s AND request_key = %s
+          AND pickup_number IS NOT NULL AND created_at > NOW() - %s
+    """, (restaurant_id, request_key, ORDER_KEY_TTL))
+    row = cur.fetchone()
+    return row["pickup_number"] if row else None
+
+
+# 佔用請求鍵：成功回傳 True；同一個鍵正在處理或已完成則回傳 False
+# 已過期但還沒被清掉的同名鍵會直接重新佔用
+# 同時送出的兩個請求，第二個會等第一個交易結束後才得到結果
+def claim_order_key(cur, restaurant_id, request_key):
+    cur.execute("""
+        INSERT INTO order_requests (restaurant_id, request_key)
+        VALUES (%s, %s)
+        ON CONFLICT (restaurant_id, request_key) DO UPDATE
+        SET pickup_number = NULL, created_at = NOW()
+        WHERE order_requests.created_at <= NOW() - %s
+        RETURNING request_key
+    """, (restaurant_id, request_key, ORDER_KEY_TTL))
+    return cur.fetchone() is not None
+
+
+# 記錄請求鍵對應的取餐號碼（與訂單同一個交易提交）
+def save_order_number(cur, restaurant_id, request_key, pickup_number):
+    cur.execute("""
+        UPDATE order_requests SET pickup_number = %s
+        WHERE restaurant_id = %s AND request_key = %s
+    """, (pickup_number, restaurant_id, request_key))
+
+
+# ---- 非同步版本（asyncpg，給 client_orders_async 使用） ----
+
+async def purge_expired_order_keys_async(conn):
+    if random.random() >= PURGE_PROBABILITY:
+        return
+    await conn.execute(PURGE_SQL.format(ttl="$1::interval", batch=PURGE_BATCH), ORDER_KEY_TTL)
+
+
+async def find_order_number_async(conn, restaurant_id, request_key):
+    return await conn.fetchval("""
+        SELECT pickup_number FROM order_requests
+        WHERE restaurant_id = $1 AND request_key = $2
+          AND pickup_number IS NOT NULL AND created_at > NOW() - $3::interval
+    """, restaurant_id, request_key, ORDER_KEY_TTL)
+
+
+async def claim_order_key_async(conn, restaurant_id, request_key):
+    claimed = await conn.fetchval("""
+        INSERT INTO order_requests (restaurant_id, request_key)
+        VALUES ($1, $2)
+        ON CONFLICT (restaurant_id, request_key) DO UPDATE
+        SET pickup_number = NULL, created_at = NOW()
+        WHERE order_requests.created_at <= NOW() - $3::interval
+        RETURNING request_key
+    """, restaurant_id, request_key, ORDER_KEY_TTL)
+    return claimed is not None
+
+
+async def save_order_number_async(conn, restaurant_id, request_key, pickup_number):
+    await conn.execute("""
+        UPDATE order_requests SET pickup_number = $1
+        WHERE restaurant_id = $2 AND request_key = $3
+    """, pickup_number, restaurant_id, request_key)
@@ -5,11 +5,16 @@ from db import get_db
 from psycopg2.extras import RealDictCursor
 import uuid
 from helpers import login_required
+from idempotency import purge_expired_order_keys, find_order_number, claim_order_key, save_order_number
 from datetime import datetime,  timedelta
 import csv
 from io import StringIO
+import click
+from menu_bulk import import_menu_zip, export_menu_zip
+from fragment_cache import category_fragments, bump_menu_version
+from analytics import record_prep_time, get_prep_stats
 
-menu_bp = Blueprint("menu_bp", __name__)  # 定義一個 Blueprint
+menu_bp = Blueprint("menu_bp", __name__, cli_group="menu")  # 定義一個 Blueprint（指令：flask menu ...）
 
 UPLOAD_FOLDER = "static/uploads"  # 檔案儲存資料夾
 MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 限制檔案上限為 5MB
@@ -59,6 +64,7 @@ def upload_menu():
                 """,
                     (session["user_id"], name, price, unique_filename, category),
                 )
+                bump_menu_version(cur, session["user_id"])  # 菜單有異動，快取失效
                 conn.commit()
 
             flash("菜單上傳成功！")
@@ -70,27 +76,69 @@ def upload_menu():
         return render_template("upload_menu.html")
 
 
+# 菜單批次匯入（ZIP：menu.csv + 圖片）
+@menu_bp.route("/import_menu", methods=["GET", "POST"])
+@login_required
+def import_menu():
+    if request.method == "POST":
+        file = request.files.get("menu_zip")
+        if not file or file.filename == "":
+            flash("沒有選擇檔案")
+            return redirect(request.url)
+
+        count, errors = import_menu_zip(get_db(), session["user_id"], file.stream)
+        if errors:
+            # 有錯誤就整批不匯入，把所有錯誤列出來
+            return render_template("import_menu.html", errors=errors)
+
+        flash(f"已匯入 {count} 道菜！")
+        return redirect(url_for("menu_bp.menu_page"))
+    else:
+        return render_template("import_menu.html")
+
+# 菜單批次匯出（可再匯入到其他分店）
+@menu_bp.route("/export_menu")
+@login_required
+def export_menu():
+    restaurant_id = session["user_id"]
+    data = export_menu_zip(get_db(readonly=True), restaurant_id)
+    response = Response(data, mimetype="application/zip")
+    response.headers["Content-Disposition"] = f"attachment; filename=menu_{restaurant_id}.zip"
+    return response
+
+# 指令列匯入：flask menu import <餐廳id> <zip檔>
+@menu_bp.cli.command("import")
+@click.argument("restaurant_id", type=int)
+@click.argument("zip_path", type=click.Path(exists=True, dir_okay=False))
+def import_menu_command(restaurant_id, zip_path):
+    with open(zip_path, "rb") as f:
+        count, errors = import_menu_zip(get_db(), restaurant_id, f)
+    if errors:
+        raise click.ClickException("\n".join(errors))
+    click.echo(f"已匯入 {count} 道菜")
+
+# 指令列匯出：flask menu export <餐廳id> <輸出zip檔>
+@menu_bp.cli.command("export")
+@click.argument("restaurant_id", type=int)
+@click.argument("zip_path", type=click.Path(dir_okay=False, writable=True))
+def export_menu_command(restaurant_id, zip_path):
+    with open(zip_path, "wb") as f:
+        f.write(export_menu_zip(get_db(), restaurant_id))
+    click.echo(f"已匯出到 {zip_path}")
+
 # 菜單邏輯
 @menu_bp.route("/menu")
 @login_required
 def menu_page():
     conn = get_db()
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
+        # 分類區塊（有快取就不用查菜單）
+        category_blocks = category_fragments(
+            cur, "_menu_category.html", session["user_id"],
             "SELECT id, name, price, image, available, category FROM menu WHERE restaurant_id = %s ORDER BY category",
-            (session["user_id"],),
-        ) 
-        items = cur.fetchall()
-    
-    # 分類整理成 dict：{分類名稱: [菜單們]}
-    items_by_category = {}
-    for item in items:
-        category = item["category"] or "其他"
-        if category not in items_by_category:
-            items_by_category[category] = []
-        items_by_category[category].append(item)
+        )
 
-    return render_template("menu.html", items_by_category=items_by_category)
+    return render_template("menu.html", category_blocks=category_blocks)
 
 # 編輯菜單按鈕
 @menu_bp.route("/edit_menu/<int:item_id>", methods=["GET", "POST"])
@@ -109,6 +157,7 @@ def edit_menu(item_id):
                 SET name = %s, price = %s, category = %s, available = %s
                 WHERE id = %s AND restaurant_id = %s
             """, (name, price, category, available, item_id, session["user_id"]))
+            bump_menu_version(cur, session["user_id"])  # 菜單有異動，快取失效
             conn.commit()
 
             flash("菜單更新成功！")
@@ -143,6 +192,7 @@ def delete_menu(item_id):
 
         cur.execute("DELETE FROM menu WHERE id = %s AND restaurant_id = %s",
                     (item_id, session["user_id"]))
+        bump_menu_version(cur, session["user_id"])  # 菜單有異動，快取失效
         conn.commit()
 
     flash("菜單已刪除！")
@@ -153,7 +203,7 @@ def delete_menu(item_id):
 @login_required
 def restaurant_orders():
     restaurant_id = session["user_id"]
-    conn = get_db()
+    conn = get_db(readonly=True)
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
             SELECT id, number, name, quantity, remark, int_out, first_time, price
@@ -203,6 +253,7 @@ def finish_order(number):
             return redirect(url_for("menu_bp.restaurant_orders"))
 
         # 2. 將資料插入到 finish_orders 表中
+        finish_time = datetime.now()   # 完成時間
         for o in orders:
             cur.execute("""
                 INSERT INTO finish_orders
@@ -217,9 +268,13 @@ def finish_order(number):
                 o["price"],
                 o["int_out"],
                 o["first_time"],
-                datetime.now()   # 完成時間
+                finish_time
             ))
 
+        # 更新出餐時間統計（以整張訂單最早的下單時間計算）
+        record_prep_time(cur, restaurant_id, min(o["first_time"] for o in orders), finish_time,
+                         {o["name"] for o in orders})
+
         # 3. 刪除原本 orders 中該號的訂單
         cur.execute("""
             DELETE FROM orders
@@ -238,8 +293,23 @@ def waiter_order():
     if request.method == "POST":
         restaurant_id = session["user_id"]
         int_out = request.form.get("int_out")
+        request_key = request.form.get("request_key")  # 前端產生的請求鍵，重送時不變
         conn = get_db()
+        if request_key:
+            purge_expired_order_keys(conn)  # 在訂單交易之外清除過期請求鍵
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # 同一個請求鍵已經下過單：直接回到訂單列表，不重複建立訂單
+            if request_key:
+                pickup_number = find_order_number(cur, restaurant_id, request_key)
+                if pickup_number is None and not claim_order_key(cur, restaurant_id, request_key):
+                    pickup_number = find_order_number(cur, restaurant_id, request_key)
+                    if pickup_number is None:
+                        return "訂單處理中，請稍後再試", 409
+                if pickup_number is not None:
+                    conn.rollback()
+                    flash(f"感謝您的訂購！您的取餐號碼是： {pickup_number}號 記下您的號碼~等待叫號")
+                    return redirect("/orders")
+
             # 查目前號碼
             cur.execute("SELECT current_number FROM number_counter WHERE restaurant_id = %s", (restaurant_id,))
             result = cur.fetchone()
@@ -269,6 +339,8 @@ def waiter_order():
             if not checking:
                 return  "請選擇至少一個菜品！", 404
 
+            if request_key:
+                save_order_number(cur, restaurant_id, request_key, pickup_number)
             conn.commit()
         flash(f"感謝您的訂購！您的取餐號碼是： {pickup_number}號 記下您的號碼~等待叫號")
 
@@ -284,26 +356,23 @@ def waiter_order():
         if not restaurant:
             return "餐廳不存在", 404
         
-        # 查出這家餐廳的菜單
-        cur.execute("SELECT * FROM menu WHERE restaurant_id = %s AND available = TRUE  ORDER BY category, name", (restaurant_id, ))
-        items = cur.fetchall()
+        # 這家餐廳菜單的各分類區塊（與客戶點餐頁共用快取）
+        category_blocks = category_fragments(
+            cur, "_order_category.html", restaurant_id,
+            "SELECT * FROM menu WHERE restaurant_id = %s AND available = TRUE  ORDER BY category, name",
+        )
 
-    # 依分類分組
-    items_by_category = {}
-    for item in items:
-        category = item["category"] or "其他"  # 若分類是 None 或空字串，就歸為「其他」
-        if category not in items_by_category:
-            items_by_category[category] = []
-        items_by_category[category].append(item)
-    
-    return render_template("waiter_order.html", restaurant=restaurant, menu_items_by_category=items_by_category)
+    # 請求鍵預設值（瀏覽器會在 pageshow 時換成自己產生的）
+    request_key = uuid.uuid4().hex
+    return render_template("waiter_order.html", restaurant=restaurant, category_blocks=category_blocks,
+                           request_key=request_key)
 
 # 歷史交易-顯示
 @menu_bp.route("/history")
 @login_required
 def history():
     restaurant_id = session["user_id"]
-    conn = get_db()
+    conn = get_db(readonly=True)
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
 
         # 取得所有歷史訂單（多帶日期）
@@ -334,7 +403,11 @@ def history():
         """, (restaurant_id,))
         today_sales = cur.fetchall()
 
-    return render_template("history.html", finish_orders=finish_orders, today_revenue=today_revenue, today_sales=today_sales)
+        # 出餐時間統計
+        prep_stats = get_prep_stats(cur, restaurant_id)
+
+    return render_template("history.html", finish_orders=finish_orders, today_revenue=today_revenue, today_sales=today_sales,
+                           prep_stats=prep_stats)
 
 # 清空歷史交易
 @menu_bp.route("/clear_history", methods=["POST"])
@@ -425,7 +498,7 @@ def export_and_clear_history():
 @login_required
 def get_orders_json():
     restaurant_id = session["user_id"]
-    conn = get_db()
+    conn = get_db(readonly=True)
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
             SELECT id, number, name, quantity, remark, int_out, first_time, price
@@ -0,0 +1,218 @@
+import csv
+import os
+import uuid
+import zipfile
+from decimal import Decimal, InvalidOperation
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO, StringIO
+from PIL import Image
+from psycopg2.extras import RealDictCursor, execute_values
+from werkzeug.utils import secure_filename
+from fragment_cache import bump_menu_version
+
+# 菜單批次匯入／匯出
+# ZIP 內容：menu.csv + 圖片檔；menu.csv 欄位：name, price, category, image, available
+# image 填 ZIP 內的圖片路徑，例如 images/beef_noodle.jpg，可留白（沒有圖片）；available 可省略（預設上架）
+
+UPLOAD_FOLDER = "static/uploads"  # 與 menu.py 相同的圖片資料夾
+ALLOWED_EXT = {"png", "jpg", "jpeg", "gif"}  # 允許的圖片格式
+MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 單張圖片上限 5MB（與單筆上傳相同）
+MAX_IMPORT_SIZE = 200 * 1024 * 1024  # ZIP 解壓後總大小上限
+MAX_ITEMS = 1000  # 一次最多匯入幾道菜
+CSV_NAME = "menu.csv"
+CSV_FIELDS = ["name", "price", "category", "image", "available"]
+IMAGE_WORKERS = min(8, (os.cpu_count() or 1) * 2)  # 圖片處理的執行緒數
+
+
+# 檢查圖片副檔名
+def allowed_file(filename):
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXT
+
+
+# 解析 menu.csv 並檢查每一列，回傳 (菜單資料, 錯誤訊息)
+def parse_menu_csv(zf):
+    if CSV_NAME not in zf.namelist():
+        return [], [f"ZIP 內找不到 {CSV_NAME}"]
+
+    try:
+        text = zf.read(CSV_NAME).decode("utf-8-sig")  # 可讀取 Excel 存的 BOM
+    except UnicodeDecodeError:
+        # 繁中 Windows 的 Excel 預設存成 Big5（cp950）
+        return [], [f"{CSV_NAME} 不是 UTF-8 編碼，請在 Excel 另存為「CSV UTF-8」後再上傳"]
+    try:
+        reader = csv.DictReader(StringIO(text))
+        fieldnames = reader.fieldnames or []
+        rows = list(reader)
+    except csv.Error as e:
+        return [], [f"{CSV_NAME} 格式錯誤：{e}"]
+    missing = {"name", "price", "image"} - set(fieldnames)
+    if missing:
+        return [], [f"{CSV_NAME} 缺少欄位：{', '.join(sorted(missing))}"]
+
+    members = {info.filename: info for info in zf.infolist()}
+    items, errors = [], []
+    for line, row in enumerate(rows, start=2):  # 第 1 行是標題
+        name = (row.get("name") or "").strip()
+        price = (row.get("price") or "").strip()
+        category = (row.get("category") or "").strip()
+        image = (row.get("image") or "").strip()
+        available = (row.get("available") or "true").strip().lower() not in ("false", "0", "no", "下架")
+
+        if not name:
+            errors.append(f"第 {line} 行：菜名不能為空")
+        try:
+            price = Decimal(price)
+            if not price.is_finite() or price < 0:
+                raise InvalidOperation
+        except InvalidOperation:
+            price = None
+            errors.append(f"第 {line} 行：價格必須是非負數字")
+        if not image:
+            pass  # 沒有圖片（例如匯出時原圖已遺失），點餐頁會略過圖片
+        elif image not in members:
+            errors.append(f"第 {line} 行：ZIP 內找不到圖片 {image}")
+        elif not allowed_file(image):
+            errors.append(f"第 {line} 行：圖片格式僅支援 png jpg, jpeg, gif")
+        elif members[image].file_size > MAX_IMAGE_SIZE:
+            errors.append(f"第 {line} 行：圖片 {image} 超過 5MB")
+
+        items.append({
+            "name": name,
+            "price": price,
+            "category": category,
+            "image": image,
+            "available": available,
+        })
+
+    if not items:
+        errors.append(f"{CSV_NAME} 沒有任何菜單資料")
+    elif len(items) > MAX_ITEMS:
+        errors.append(f"一次最多匯入 {MAX_ITEMS} 道菜")
+    return items, errors
+
+
+# 確認圖片內容是真的圖片（在執行緒中執行）
+def verify_image(data):
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.verify()
+    except Exception:
+        return False
+    return True
+
+
+# 產生不會重複的圖片檔名
+def unique_image_name(member):
+    filename = secure_filename(os.path.basename(member)) or "image"
+    return f"{uuid.uuid4().hex}_{filename}"
+
+
+# 把圖片存到 static/uploads（在執行緒中執行）
+def save_image(unique_filename, data):
+    with open(os.path.join(UPLOAD_FOLDER, unique_filename), "wb") as f:
+        f.write(data)
+
+
+# 刪除已存的圖片（匯入失敗時使用）
+def remove_images(filenames):
+    for filename in filenames:
+        path = os.path.join(UPLOAD_FOLDER, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# 批次匯入：先全部檢查，再平行處理圖片，最後一個交易寫入所有菜單
+# 回傳 (匯入筆數, 錯誤訊息)；有任何錯誤就不會寫入
+def import_menu_zip(conn, restaurant_id, fileobj):
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        return 0, ["檔案不是有效的 ZIP"]
+
+    with zf:
+        if sum(info.file_size for info in zf.infolist()) > MAX_IMPORT_SIZE:
+            return 0, ["ZIP 解壓後太大"]
+
+        items, errors = parse_menu_csv(zf)
+        if errors:
+            return 0, errors
+
+        # 同一張圖片可能被多道菜共用，讀取與檢查只做一次
+        members = sorted({item["image"] for item in items if item["image"]})
+        images = {member: zf.read(member) for member in members}
+
+    with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as pool:
+        valid = dict(zip(members, pool.map(verify_image, [images[m] for m in members])))
+        errors = [f"圖片 {m} 無法讀取" for m in members if not valid[m]]
+        if errors:
+            return 0, errors
+
+        # 每道菜各存一份圖片（與單筆上傳相同），刪除其中一道菜才不會影響其他菜
+        # 檔名先決定好，存到一半失敗時才知道要刪哪些
+        saved = [unique_image_name(item["image"]) if item["image"] else None for item in items]
+        futures = [
+            pool.submit(save_image, filename, images[item["image"]])
+            for item, filename in zip(items, saved) if filename
+        ]
+        wait(futures)  # 全部存完（或失敗）才檢查，避免刪除時還有執行緒在寫
+        failed = [f.exception() for f in futures if f.exception() is not None]
+        if failed:
+            remove_images(filename for filename in saved if filename)
+            raise failed[0]
+
+    try:
+        with conn.cursor() as cur:
+            # 多筆資料一次 INSERT
+            execute_values(cur, """
+                INSERT INTO menu (restaurant_id, name, price, image, category, available)
+                VALUES %s
+            """, [
+                (restaurant_id, item["name"], item["price"], filename, item["category"], item["available"])
+                for item, filename in zip(items, saved)
+            ])
+            bump_menu_version(cur, restaurant_id)  # 菜單有異動，快取失效
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # 寫入失敗就把剛存的圖片刪掉
+        remove_images(filename for filename in saved if filename)
+        raise
+
+    return len(items), []
+
+
+# 批次匯出：回傳 ZIP 內容（可直接再匯入到其他分店）
+def export_menu_zip(conn, restaurant_id):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            "SELECT name, price, category, image, available FROM menu WHERE restaurant_id = %s ORDER BY category, name",
+            (restaurant_id,),
+        )
+        items = cur.fetchall()
+
+    output = StringIO()
+    output.write("\ufeff")  # BOM，Excel 開啟才不會亂碼
+    writer = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        written = set()
+        for item in items:
+            image = ""  # 原圖遺失就留白，匯入時視為沒有圖片
+            path = os.path.join(UPLOAD_FOLDER, item["image"] or "")
+            if item["image"] and os.path.isfile(path):
+                image = f"images/{item['image']}"
+                if image not in written:
+                    zf.write(path, image)
+                    written.add(image)
+            writer.writerow({
+                "name": item["name"],
+                "price": item["price"],
+                "category": item["category"] or "",
+                "image": image,
+                "available": "true" if item["available"] else "false",
+            })
+        zf.writestr(CSV_NAME, output.getvalue().encode("utf-8"))
+
+    return buffer.getvalue()
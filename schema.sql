@@ -0,0 +1,28 @@
+-- 應用程式自己新增的資料表，部署時用 flask --app app init-db 執行（db.ensure_schema，可重複執行）
+
+-- 訂單請求鍵（防止重複下單，見 idempotency.py）
+CREATE TABLE IF NOT EXISTS order_requests (
+    restaurant_id INTEGER NOT NULL,
+    request_key TEXT NOT NULL,
+    pickup_number INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (restaurant_id, request_key)
+);
+CREATE INDEX IF NOT EXISTS order_requests_created_at_idx ON order_requests (created_at);
+
+-- 菜單版本，菜單異動時 +1（分類區塊快取用，見 fragment_cache.py）
+CREATE TABLE IF NOT EXISTS menu_versions (
+    restaurant_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- 出餐時間統計（見 analytics.py）
+CREATE TABLE IF NOT EXISTS prep_time_stats (
+    restaurant_id INTEGER NOT NULL,
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    total_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sketch JSONB NOT NULL DEFAULT '{}',  -- {桶編號: 次數}
+    PRIMARY KEY (restaurant_id, scope, key)
+);